@@ -15,17 +15,54 @@ bl_info = {
 }
 
 import bpy
+import hashlib
+import io
 import os
-import xml.etree.ElementTree as ET
+import sys
 import math
 import mathutils
+import numpy as np
 import time
 import re
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
 from bpy.props import StringProperty, CollectionProperty, BoolProperty, EnumProperty, IntProperty
 from bpy_extras.io_utils import ImportHelper, ExportHelper
 from bpy.types import Operator, Panel, PropertyGroup, AddonPreferences
 
+# lxml is a lot faster for big maps, fall back to stdlib if blenders python doesnt have it
+try:
+    from lxml import etree as ET
+    HAS_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    HAS_LXML = False
+
+# 3ds sub objects we never want as the prop mesh
+SKIP_MESH_RE = re.compile(r'occl|box|plane', re.IGNORECASE)
+# blenders .001 style duplicate suffix
+BLENDER_SUFFIX_RE = re.compile(r'\.\d+$')
+
+# folder inside the prop libraries directory where converted meshes get saved
+MESH_CACHE_DIR_NAME = "_cache"
+
+# parsed prop libraries per prop libraries directory, as (signature, prop_libraries).
+# cleared by the Refresh Libraries button
+_library_cache = {}
+
+# name of the image texture node in imported materials
+TEXTURE_NODE_NAME = "XML Diffuse Texture"
+
+# everything a prop type needs, resolved once and shared by all its instances.
+# texture_paths maps texture name -> diffuse map path (None if the texture has no diffuse map)
+PropDef = namedtuple('PropDef', ['mesh_data', 'texture_paths'])
+
+def read_file_bytes(path):
+    # one big read is cheaper than letting the parser pull the file through small buffered reads
+    with open(path, 'rb') as f:
+        return f.read()
+
 # preferences
 class XMLMapImporterPreferences(AddonPreferences):
     bl_idname = __name__
@@ -43,12 +80,21 @@ class XMLMapImporterPreferences(AddonPreferences):
         min=10,
         max=1000
     )
+    
+    threads: IntProperty(
+        name="Threads",
+        description="Number of threads used to read prop library files (0 = automatic)",
+        default=0,
+        min=0,
+        max=64
+    )
 
     def draw(self, context):
         layout = self.layout
         layout.label(text="XML Map Importer Settings")
         layout.prop(self, "prop_libs_directory")
         layout.prop(self, "batch_size")
+        layout.prop(self, "threads")
 
 
 class PropLibraryItem(PropertyGroup):
@@ -125,7 +171,7 @@ class IMPORT_OT_xml_map(Operator, ImportHelper):
     
     use_caching: BoolProperty(
         name="Cache Props",
-        description="Cache prop meshes to speed up loading of repeated props",
+        description="Cache prop meshes to speed up loading of repeated props. Instances of a prop share one mesh, textures are set per object",
         default=True,
     )
 
@@ -137,6 +183,11 @@ class IMPORT_OT_xml_map(Operator, ImportHelper):
             self.report({'ERROR'}, f"Prop libraries directory not found: {prop_libs_dir}")
             return {'CANCELLED'}
         
+        # constant for the whole run, no need to look them up per prop
+        self._scale = float(self.scale_factor)
+        self._z_up_axis = self.axis_up == 'Z'
+        self._do_textures = self.import_textures
+        
         start_time = time.time()
         result = self.import_xml_map(context, prop_libs_dir)
         end_time = time.time()
@@ -148,13 +199,12 @@ class IMPORT_OT_xml_map(Operator, ImportHelper):
     
     def import_xml_map(self, context, prop_libs_dir):
         try:
-            tree = ET.parse(self.filepath)
-            root = tree.getroot()
+            props_by_type = self.read_static_geometry(self.filepath)
         except Exception as e:
             self.report({'ERROR'}, f"Error parsing XML file: {e}")
             return {'CANCELLED'}
         
-        if root.tag != 'map':
+        if props_by_type is None:
             self.report({'ERROR'}, "Not a valid map file")
             return {'CANCELLED'}
         
@@ -166,309 +216,547 @@ class IMPORT_OT_xml_map(Operator, ImportHelper):
             bpy.context.scene.collection.children.link(map_collection)
         
         self.report({'INFO'}, "Loading prop libraries...")
-        prop_libraries = self.load_prop_libraries(prop_libs_dir)
+        prefs = context.preferences.addons[__name__].preferences
+        prop_libraries = self.load_prop_libraries(prop_libs_dir, prefs.threads)
+        
+        self._image_cache = {}
+        self._material_template = None
         
         if self.use_caching:
             self._mesh_cache = {}
             self._material_cache = {}
+            self._disk_cache_dir = os.path.join(prop_libs_dir, MESH_CACHE_DIR_NAME)
         
-        static_geometry = root.find('static-geometry')
-        if static_geometry is not None:
-            self.import_static_geometry(context, static_geometry, prop_libraries, map_collection)
+        # one temp collection for every 3ds import of this run, removed once at the end
+        self._temp_collection = bpy.data.collections.new("__xml_import_temp")
+        bpy.context.scene.collection.children.link(self._temp_collection)
         
-        if self.use_caching:
-            self._mesh_cache = {}
-            self._material_cache = {}
+        try:
+            if props_by_type:
+                self.import_static_geometry(context, props_by_type, prop_libraries, map_collection)
+        finally:
+            bpy.data.collections.remove(self._temp_collection)
+            self._temp_collection = None
+            
+            if self._material_template is not None:
+                bpy.data.materials.remove(self._material_template)
+                self._material_template = None
         
         self.report({'INFO'}, f"XML Map imported successfully: {map_name}")
         return {'FINISHED'}
     
-    def load_prop_libraries(self, prop_libs_dir):
+    def load_prop_libraries(self, prop_libs_dir, threads=0):
         prop_libraries = {}
         
-        lib_dirs = [os.path.join(prop_libs_dir, item) for item in os.listdir(prop_libs_dir) 
-                   if os.path.isdir(os.path.join(prop_libs_dir, item))]
+        # scandir caches the dir type, so no extra stat per entry. our own mesh cache
+        # folder lives in here too and never has a library.xml
+        with os.scandir(prop_libs_dir) as entries:
+            lib_dirs = [entry.path for entry in entries
+                        if entry.name != MESH_CACHE_DIR_NAME and entry.is_dir()]
         
+        # a stat per library.xml is way cheaper than parsing them all again, so reuse the
+        # last result for this directory as long as no library.xml was added, removed or changed
+        signature = []
         for lib_dir in lib_dirs:
-            lib_xml_path = os.path.join(lib_dir, "library.xml")
+            try:
+                signature.append((lib_dir, os.stat(os.path.join(lib_dir, "library.xml")).st_mtime))
+            except OSError:
+                continue
+        signature = tuple(sorted(signature))
+        
+        cache_key = os.path.normcase(os.path.abspath(prop_libs_dir))
+        cached = _library_cache.get(cache_key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        
+        def parse_library(lib_dir):
+            # runs on a worker thread, only parses, no bpy access in here
+            parser = None
+            if HAS_LXML:
+                # parser instances arent shared between threads, so each worker makes its own
+                parser = ET.XMLParser(huge_tree=True, remove_blank_text=True, collect_ids=False)
+            
+            try:
+                return lib_dir, ET.fromstring(read_file_bytes(os.path.join(lib_dir, "library.xml")), parser)
+            except OSError:
+                # no library.xml in this folder
+                return lib_dir, None
+            except Exception as e:
+                print(f"Error loading prop library {lib_dir}: {e}")
+                return lib_dir, None
+        
+        # parsing is mostly file io (and lxml drops the GIL), so read all the library.xml files at once
+        max_workers = threads or min(32, (os.cpu_count() or 1) * 4)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            parsed_libraries = list(executor.map(parse_library, lib_dirs))
+        
+        for lib_dir, lib_root in parsed_libraries:
+            if lib_root is None:
+                continue
             
-            if os.path.exists(lib_xml_path):
-                try:
-                    lib_tree = ET.parse(lib_xml_path)
-                    lib_root = lib_tree.getroot()
+            try:
+                lib_name = lib_root.get('name')
+                if lib_name:
+                    prop_libraries[lib_name] = {
+                        'path': lib_dir,
+                        'xml': lib_root,
+                        'props': {}
+                    }
                     
-                    lib_name = lib_root.get('name')
-                    if lib_name:
-                        prop_libraries[lib_name] = {
-                            'path': lib_dir,
-                            'xml': lib_root,
-                            'props': {}
-                        }
+                    props_dict = {}
+                    for prop_group in lib_root.iter('prop-group'):
+                        group_name = prop_group.get('name')
                         
-                        props_dict = {}
-                        for prop_group in lib_root.findall('.//prop-group'):
-                            group_name = prop_group.get('name')
-                            
-                            for prop in prop_group.findall('.//prop'):
-                                prop_name = prop.get('name')
-                                prop_key = f"{group_name}/{prop_name}" 
-                                props_dict[prop_key] = prop
-                        
-                        prop_libraries[lib_name]['props'] = props_dict
-                
-                except Exception as e:
-                    print(f"Error loading prop library {lib_dir}: {e}")
+                        for prop in prop_group.iter('prop'):
+                            prop_name = prop.get('name')
+                            props_dict[(group_name, prop_name)] = prop
+                    
+                    prop_libraries[lib_name]['props'] = props_dict
+            
+            except Exception as e:
+                print(f"Error loading prop library {lib_dir}: {e}")
+        
+        _library_cache[cache_key] = (signature, prop_libraries)
         
         return prop_libraries
     
-    def import_static_geometry(self, context, static_geometry, prop_libraries, parent_collection):
-        target_collection = parent_collection or context.scene.collection
-        
-        props_to_import = []
-        for prop_elem in static_geometry.findall('.//prop'):
-            library_name = prop_elem.get('library-name')
-            group_name = prop_elem.get('group-name')
-            prop_name = prop_elem.get('name')
+    def read_static_geometry(self, filepath):
+        # stream the map so we never hold the whole DOM, props go straight into their type group.
+        # returns None if its not a map file
+        props_by_type = defaultdict(list)
+        root = None
+        static_geometry_elem = None
+        
+        iterparse_options = {}
+        if HAS_LXML:
+            # lxml can filter events itself so we never see the position/rotation children
+            iterparse_options['tag'] = ('map', 'static-geometry', 'prop')
+        
+        map_data = io.BytesIO(read_file_bytes(filepath))
+        
+        for event, elem in ET.iterparse(map_data, events=('start', 'end'), **iterparse_options):
+            if root is None:
+                # with the tag filter the first event can be a <map> further down, so look at the real root
+                root = elem.getroottree().getroot() if HAS_LXML else elem
+                if root.tag != 'map':
+                    return None
+                continue
             
-            position_elem = prop_elem.find('.//position')
-            if position_elem is None:
+            if elem.tag == 'static-geometry':
+                static_geometry_elem = elem if event == 'start' else None
                 continue
-                
-            x = float(position_elem.find('x').text)
-            y = float(position_elem.find('y').text)
-            z = float(position_elem.find('z').text)
-            
-            rotation_elem = prop_elem.find('.//rotation')
-            rot_z = 0.0
-            if rotation_elem is not None and rotation_elem.find('z') is not None:
-                rot_z = float(rotation_elem.find('z').text)
-                
-                if self.rotation_mode == 'DEGREES':
-                    rot_z = math.radians(rot_z)
             
-            texture_name_elem = prop_elem.find('.//texture-name')
-            texture_name = ""
-            if texture_name_elem is not None and texture_name_elem.text:
-                texture_name = texture_name_elem.text
-            
-            props_to_import.append({
-                'library_name': library_name,
-                'group_name': group_name,
-                'prop_name': prop_name,
-                'position': (x, y, z),
-                'rotation': rot_z,
-                'texture_name': texture_name
-            })
+            if event != 'end' or elem.tag != 'prop' or static_geometry_elem is None:
+                continue
+            
+            prop_info = self.parse_prop_element(elem)
+            if prop_info is not None:
+                prop_key = (prop_info['library_name'], prop_info['group_name'], prop_info['prop_name'])
+                props_by_type[prop_key].append(prop_info)
+            
+            # drop the finished props so memory stays flat, works the same for lxml and stdlib
+            del static_geometry_elem[:]
+        
+        if root is None:
+            return None
+        
+        return props_by_type
+    
+    def parse_prop_element(self, prop_elem):
+        # the same few names repeat for thousands of props, interning keeps one copy of each
+        intern = sys.intern
+        library_name = intern(prop_elem.get('library-name') or "")
+        group_name = intern(prop_elem.get('group-name') or "")
+        prop_name = intern(prop_elem.get('name') or "")
+        
+        # position/rotation/texture-name are direct children, so one pass over them finds all three
+        position_elem = rotation_elem = texture_name_elem = None
+        for child in prop_elem:
+            tag = child.tag
+            if tag == 'position':
+                position_elem = child
+            elif tag == 'rotation':
+                rotation_elem = child
+            elif tag == 'texture-name':
+                texture_name_elem = child
+        
+        if position_elem is None:
+            return None
+        
+        # maps (and our exporter) always write x, y, z in that order, so unpack them directly
+        # and only build a tag lookup if something else wrote the file
+        children = position_elem[:]
+        if len(children) == 3 and (children[0].tag, children[1].tag, children[2].tag) == ('x', 'y', 'z'):
+            x, y, z = float(children[0].text), float(children[1].text), float(children[2].text)
+        else:
+            # lxml hands comments over as children too (their tag isnt even a str), only read x/y/z
+            coords = {c.tag: float(c.text) for c in children if c.tag in ('x', 'y', 'z')}
+            x, y, z = coords['x'], coords['y'], coords['z']
+        
+        rot_z = 0.0
+        if rotation_elem is not None:
+            # only z is used, so dont touch x/y at all.
+            # left in the files unit, compute_transforms converts degrees for the whole map at once
+            rot_z_text = rotation_elem.findtext('z')
+            if rot_z_text:
+                rot_z = float(rot_z_text)
+        
+        texture_name = ""
+        if texture_name_elem is not None and texture_name_elem.text:
+            texture_name = intern(texture_name_elem.text)
+        
+        return {
+            'library_name': library_name,
+            'group_name': group_name,
+            'prop_name': prop_name,
+            'position': (x, y, z),
+            'rotation': rot_z,
+            'texture_name': texture_name
+        }
+    
+    def import_static_geometry(self, context, props_by_type, prop_libraries, parent_collection):
+        target_collection = parent_collection or context.scene.collection
         
         prefs = context.preferences.addons[__name__].preferences
         batch_size = prefs.batch_size
         
-        total_props = len(props_to_import)
+        total_props = sum(len(props) for props in props_by_type.values())
         self.report({'INFO'}, f"Importing {total_props} props...")
         
-        props_by_type = defaultdict(list)
-        for prop_info in props_to_import:
-            prop_key = f"{prop_info['library_name']}/{prop_info['group_name']}/{prop_info['prop_name']}"
-            props_by_type[prop_key].append(prop_info)
+        # every unique mesh gets loaded once up front, the per prop loop only creates objects.
+        # the 3ds importer puts objects in the active collection so point it at the temp one
+        # for the whole preload instead of switching back and forth per mesh
+        original_active_collection = context.view_layer.active_layer_collection
+        context.view_layer.active_layer_collection = context.view_layer.layer_collection.children[self._temp_collection.name]
+        
+        try:
+            prop_defs = {}
+            for prop_type, props in props_by_type.items():
+                prop_info = props[0]
+                prop_defs[prop_type] = self.load_prop_def(prop_info['library_name'], prop_info['group_name'], 
+                                                          prop_info['prop_name'], prop_libraries)
+        finally:
+            context.view_layer.active_layer_collection = original_active_collection
         
+        # objects are created unlinked and linked in one go at the end, so blender
+        # only has to rebuild the depsgraph once instead of per prop
+        new_objects = []
+        imported_props = []
         imported_count = 0
         for prop_type, props in props_by_type.items():
-            if props:
-                prop_info = props[0]
-                self.import_prop(context, prop_info['library_name'], prop_info['group_name'], 
-                                prop_info['prop_name'], prop_info['position'], prop_info['rotation'], 
-                                prop_info['texture_name'], prop_libraries, target_collection)
-                imported_count += 1
-                
-                for prop_info in props[1:]:
-                    self.import_prop(context, prop_info['library_name'], prop_info['group_name'], 
-                                    prop_info['prop_name'], prop_info['position'], prop_info['rotation'], 
-                                    prop_info['texture_name'], prop_libraries, target_collection)
-                    imported_count += 1
-
-                    if imported_count % 50 == 0:
-                        self.report({'INFO'}, f"Imported {imported_count}/{total_props} props...")
+            prop_def = prop_defs[prop_type]
+            if prop_def is not None:
+                new_objects.extend(self.import_prop_type(prop_def, props))
+                imported_props.extend(props)
+            
+            previous_count = imported_count
+            imported_count += len(props)
+            
+            if imported_count // 50 != previous_count // 50:
+                self.report({'INFO'}, f"Imported {imported_count}/{total_props} props...")
+        
+        if new_objects:
+            # transforms for the whole map in one go, in the same order as new_objects
+            locations, rotations = self.compute_transforms(imported_props)
+            self.apply_transforms(target_collection, new_objects, locations, rotations)
+        
+        context.view_layer.update()
         
         self.report({'INFO'}, f"Finished importing {imported_count} props")
     
-    def import_prop(self, context, library_name, group_name, prop_name, 
-                   position, rotation, texture_name, prop_libraries, parent_collection):
-        if library_name not in prop_libraries:
-            return None
+    def compute_transforms(self, props):
+        # worked out in float64, blender stores float32 so only apply_transforms' final cast should round
+        locations = np.asarray([p['position'] for p in props], dtype=np.float64) * self._scale
+        angles = np.asarray([p['rotation'] for p in props], dtype=np.float64)
+        if self.rotation_mode == 'DEGREES':
+            np.radians(angles, out=angles)
+        
+        rotations = np.zeros((len(props), 3), dtype=np.float64)
+        if self._z_up_axis:
+            rotations[:, 2] = angles
+        else:
+            locations = locations[:, [0, 2, 1]]
+            # Z rotation converted through the 90 degree X axis swap ends up as a rotation around -Y
+            rotations[:, 1] = -angles
         
-        library = prop_libraries[library_name]
-        prop_key = f"{group_name}/{prop_name}"
+        return locations, rotations
+    
+    def apply_transforms(self, target_collection, new_objects, locations, rotations):
+        scales = np.full(locations.shape, self._scale, dtype=np.float32)
+        
+        collection_objects = target_collection.objects
+        was_empty = len(collection_objects) == 0
+        
+        link = collection_objects.link
+        for prop_obj in new_objects:
+            link(prop_obj)
         
-        if prop_key not in library['props']:
+        if was_empty:
+            # collection only holds our props (in link order), so set everything in one call
+            collection_objects.foreach_set('location', locations.astype(np.float32).ravel())
+            collection_objects.foreach_set('rotation_euler', rotations.astype(np.float32).ravel())
+            collection_objects.foreach_set('scale', scales.ravel())
+        else:
+            for prop_obj, location, rotation, scale in zip(new_objects, locations, rotations, scales):
+                prop_obj.location = location
+                # new objects already have zero rotation
+                if rotation.any():
+                    prop_obj.rotation_euler = rotation
+                prop_obj.scale = scale
+    
+    def load_prop_def(self, library_name, group_name, prop_name, prop_libraries):
+        library = prop_libraries.get(library_name)
+        if library is None:
             return None
         
-        prop_def = library['props'][prop_key]
+        prop_elem = library['props'].get((group_name, prop_name))
+        if prop_elem is None:
+            return None
         
-        mesh_elem = prop_def.find('.//mesh')
+        mesh_elem = next(prop_elem.iter('mesh'), None)
         if mesh_elem is None:
             return None
         
         mesh_file = mesh_elem.get('file')
         mesh_path = os.path.join(library['path'], mesh_file)
         
-        if not os.path.exists(mesh_path):
+        # one stat for both the existence check and the disk cache freshness check
+        try:
+            mesh_mtime = os.path.getmtime(mesh_path)
+        except OSError:
             return None
         
-        cache_key = f"{library_name}_{group_name}_{prop_name}"
+        cache_key = (library_name, group_name, prop_name)
         
         mesh_data = None
-        material = None
         
         if self.use_caching and cache_key in self._mesh_cache:
-            original_mesh_data = self._mesh_cache[cache_key]
-            mesh_data = original_mesh_data.copy()
-            
-            if texture_name and texture_name in self._material_cache:
-                material = self._material_cache[texture_name]
+            mesh_data = self._mesh_cache[cache_key]
         else:
-            mesh_data = self.import_mesh_data(context, mesh_path, library_name, prop_name)
+            if self.use_caching:
+                mesh_data = self.load_cached_mesh(mesh_path, mesh_mtime, library_name, group_name, prop_name)
+            
+            if mesh_data is None:
+                mesh_data = self.import_mesh_data(mesh_path)
+                
+                if mesh_data:
+                    # the kept mesh still has whatever name the 3ds object had, name it after the prop
+                    mesh_data.name = f"{library_name}::{group_name}::{prop_name}"
+                
+                if self.use_caching and mesh_data:
+                    self.write_cached_mesh(mesh_data, mesh_path, mesh_mtime, library_name, group_name, prop_name)
             
             if self.use_caching and mesh_data:
                 self._mesh_cache[cache_key] = mesh_data
         
-        if mesh_data:
-            object_name = f"{library_name}::{group_name}::{prop_name}"
-            object_name = object_name.replace(" ", "_")
-            prop_obj = bpy.data.objects.new(object_name, mesh_data)
-            
-            parent_collection.objects.link(prop_obj)
-            
-            scaled_position = [p * self.scale_factor for p in position]
-            
-            if self.axis_up == 'Z':
-                final_position = (scaled_position[0], scaled_position[1], scaled_position[2])
-            else:
-                final_position = (scaled_position[0], scaled_position[2], scaled_position[1])
-            
-            prop_obj.location = final_position
-            
-            rot_matrix = mathutils.Matrix.Rotation(rotation, 4, 'Z')
-            
-            if self.axis_up == 'Z':
-                prop_obj.rotation_euler = rot_matrix.to_euler('XYZ')
-            else:
-                conversion_matrix = mathutils.Matrix.Rotation(math.pi/2.0, 4, 'X')
-                final_rotation = conversion_matrix @ rot_matrix @ conversion_matrix.inverted()
-                prop_obj.rotation_euler = final_rotation.to_euler()
+        if mesh_data is None:
+            return None
+        
+        # built once per prop type so materials dont need an xpath search, and not at all
+        # if textures are turned off
+        texture_paths = {}
+        if self._do_textures:
+            for texture_elem in mesh_elem.iter('texture'):
+                texture_name = texture_elem.get('name')
+                if texture_name in texture_paths:
+                    continue
+                
+                diffuse_map = texture_elem.get('diffuse-map')
+                texture_paths[texture_name] = os.path.join(library['path'], diffuse_map) if diffuse_map else None
+        
+        return PropDef(mesh_data, texture_paths)
+    
+    def import_prop_type(self, prop_def, props):
+        # every instance of a type has the same names, mesh and material lookups, so do those once
+        prop_info = props[0]
+        library_name = prop_info['library_name']
+        group_name = prop_info['group_name']
+        prop_name = prop_info['prop_name']
+        
+        object_name = f"{library_name}::{group_name}::{prop_name}"
+        object_name = object_name.replace(" ", "_")
+        
+        # object linked materials still need a slot on the mesh, add it once for the whole type
+        if self._do_textures and not prop_def.mesh_data.materials:
+            prop_def.mesh_data.materials.append(None)
+        
+        new_objects = []
+        new_object = bpy.data.objects.new
+        
+        for i, prop_info in enumerate(props):
+            # shared instances all use the same mesh, materials go on the object slot.
+            # without caching every prop gets its own copy of the mesh
+            mesh_data = prop_def.mesh_data
+            if i > 0 and not self.use_caching:
+                mesh_data = mesh_data.copy()
             
-            prop_obj.scale = (self.scale_factor, self.scale_factor, self.scale_factor)
+            prop_obj = new_object(object_name, mesh_data)
             
             prop_obj["xml_library_name"] = library_name
             prop_obj["xml_group_name"] = group_name
             prop_obj["xml_prop_name"] = prop_name
             
+            texture_name = prop_info['texture_name']
             if texture_name:
                 prop_obj["xml_texture_name"] = texture_name
                 prop_obj["xml_has_texture"] = True
             else:
                 prop_obj["xml_has_texture"] = False
             
-            if self.import_textures and texture_name:
+            if self._do_textures and texture_name:
+                material = self.get_material(prop_def, texture_name)
                 if material:
-                    if prop_obj.data.materials:
-                        prop_obj.data.materials[0] = material
-                    else:
-                        prop_obj.data.materials.append(material)
-                else:
-                    material = self.create_material(texture_name, mesh_elem, library)
-                    if material:
-                        if prop_obj.data.materials:
-                            prop_obj.data.materials[0] = material
-                        else:
-                            prop_obj.data.materials.append(material)
-                        
-                        if self.use_caching:
-                            self._material_cache[texture_name] = material
+                    self.assign_material(prop_obj, material)
             
-            return prop_obj
+            new_objects.append(prop_obj)
         
-        return None
+        return new_objects
     
-    def import_mesh_data(self, context, mesh_path, library_name, prop_name):
-        pre_import_objects = set(bpy.data.objects)
+    def get_material(self, prop_def, texture_name):
+        texture_path = prop_def.texture_paths.get(texture_name)
+        # same texture name can point at different files in different props
+        material_key = (texture_name, texture_path)
+        
+        if self.use_caching and material_key in self._material_cache:
+            return self._material_cache[material_key]
+        
+        material = self.create_material(texture_name, texture_path)
         
-        temp_collection = bpy.data.collections.new("__temp_import")
-        bpy.context.scene.collection.children.link(temp_collection)
+        if self.use_caching and material:
+            self._material_cache[material_key] = material
+        
+        return material
+    
+    def get_cached_mesh_path(self, library_name, group_name, prop_name, mesh_path):
+        # clean_name turns anything but letters and digits into _, so names alone can collide.
+        # hash the raw names plus the mesh file instead, a prop pointed at another 3ds gets a new file
+        cache_id = "\0".join((library_name, group_name, prop_name, mesh_path))
+        file_name = hashlib.sha1(cache_id.encode('utf-8')).hexdigest() + ".blend"
+        return os.path.join(self._disk_cache_dir, bpy.path.clean_name(library_name), file_name)
+    
+    def load_cached_mesh(self, mesh_path, mesh_mtime, library_name, group_name, prop_name):
+        # .blend copy of an already converted 3ds, only used if it was made from this exact 3ds file
+        cache_path = self.get_cached_mesh_path(library_name, group_name, prop_name, mesh_path)
+        
+        if not os.path.isfile(cache_path):
+            return None
+        
+        try:
+            with bpy.data.libraries.load(cache_path, link=False) as (data_from, data_to):
+                data_to.meshes = data_from.meshes[:1]
+        except Exception as e:
+            print(f"Error loading cached mesh {cache_path}: {e}")
+            return None
+        
+        if not data_to.meshes or data_to.meshes[0] is None:
+            return None
+        
+        mesh_data = data_to.meshes[0]
+        source_path = mesh_data.get("xml_cache_source")
+        source_mtime = mesh_data.get("xml_cache_mtime")
+        
+        if source_path != mesh_path or source_mtime != mesh_mtime:
+            bpy.data.meshes.remove(mesh_data)
+            return None
+        
+        del mesh_data["xml_cache_source"]
+        del mesh_data["xml_cache_mtime"]
+        # written with a fake user, drop it so the mesh gets cleaned up like any other
+        mesh_data.use_fake_user = False
+        
+        return mesh_data
+    
+    def write_cached_mesh(self, mesh_data, mesh_path, mesh_mtime, library_name, group_name, prop_name):
+        cache_path = self.get_cached_mesh_path(library_name, group_name, prop_name, mesh_path)
+        
+        # saved with the mesh so loading can tell which 3ds (and which version of it) it came from
+        mesh_data["xml_cache_source"] = mesh_path
+        mesh_data["xml_cache_mtime"] = mesh_mtime
+        
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            # the mesh has no users yet (its 3ds object is already gone) and the writer skips
+            # zero user data, so it needs a fake user to end up in the file
+            bpy.data.libraries.write(cache_path, {mesh_data}, path_remap='ABSOLUTE', fake_user=True)
+        except Exception as e:
+            print(f"Error writing cached mesh {cache_path}: {e}")
+        finally:
+            del mesh_data["xml_cache_source"]
+            del mesh_data["xml_cache_mtime"]
+    
+    def assign_material(self, prop_obj, material):
+        # link the slot to the object so props sharing a mesh can still have different textures.
+        # import_prop_type makes sure the mesh has a slot to link
+        slot = prop_obj.material_slots[0]
+        slot.link = 'OBJECT'
+        slot.material = material
+    
+    def import_mesh_data(self, mesh_path):
+        # the temp collection is the active one during the preload, so whatever the 3ds importer
+        # creates ends up in there and nowhere else, no need to diff all of bpy.data.objects
+        best_mesh = None
         
         try:
-            original_active_collection = context.view_layer.active_layer_collection
-            temp_layer_collection = context.view_layer.layer_collection.children[temp_collection.name]
-            context.view_layer.active_layer_collection = temp_layer_collection
-            
             bpy.ops.import_scene.max3ds(filepath=mesh_path)
-
-            context.view_layer.active_layer_collection = original_active_collection
             
-            imported_objects = [obj for obj in bpy.data.objects if obj not in pre_import_objects]
+            imported_objects = list(self._temp_collection.all_objects)
             
             mesh_objects = [obj for obj in imported_objects if obj.type == 'MESH']
             
-            if not mesh_objects:
-                bpy.data.collections.remove(temp_collection)
-                return None
-            
-            filtered_mesh_objects = [obj for obj in mesh_objects 
-                                    if not any(skip_term in obj.name.lower() 
-                                              for skip_term in ["occl", "box", "plane"])]
-            
-            if not filtered_mesh_objects:
-                for obj in imported_objects:
-                    bpy.data.objects.remove(obj, do_unlink=True)
-                bpy.data.collections.remove(temp_collection)
-                return None
+            filtered_mesh_objects = [obj for obj in mesh_objects if not SKIP_MESH_RE.search(obj.name)]
                 
             meshes_with_materials = [obj for obj in filtered_mesh_objects if 
-                                   obj.data.materials and 
-                                   len(obj.data.materials) > 0 and 
                                    any(mat is not None for mat in obj.data.materials)]
             
-            best_mesh = None
             if meshes_with_materials:
-                meshes_with_materials.sort(key=lambda obj: len(obj.data.vertices), reverse=True)
-                best_mesh = meshes_with_materials[0].data
-                best_mesh = best_mesh.copy()
-            
-            for obj in imported_objects:
-                bpy.data.objects.remove(obj, do_unlink=True)
-            
-            bpy.data.collections.remove(temp_collection)
+                # keep the imported mesh itself rather than a copy, everything else gets freed below
+                best_mesh = max(meshes_with_materials, key=lambda obj: len(obj.data.vertices)).data
             
             return best_mesh
             
         except Exception as e:
-            if temp_collection and temp_collection.name in bpy.data.collections:
-                bpy.data.collections.remove(temp_collection)
-                
             print(f"Error importing mesh {mesh_path}: {e}")
+            best_mesh = None
             return None
+        
+        finally:
+            # read the collection again here so a 3ds that failed halfway still gets cleaned out,
+            # otherwise its leftovers would be picked up by the next import.
+            # removing the objects leaves their meshes behind as orphans, which used to pile up
+            # for every 3ds that got imported, so those go in the same batch
+            imported_objects = list(self._temp_collection.all_objects)
+            imported_meshes = {obj.data for obj in imported_objects if obj.type == 'MESH'}
+            imported_meshes.discard(best_mesh)
+            
+            bpy.data.batch_remove(imported_objects + list(imported_meshes))
     
-    def create_material(self, texture_name, mesh_elem, library):
-        texture_elem = mesh_elem.find(f'.//texture[@name="{texture_name}"]')
-        if texture_elem is None:
+    def create_material(self, texture_name, texture_path):
+        if not texture_path:
             return None
         
-        diffuse_map = texture_elem.get('diffuse-map')
-        if not diffuse_map:
-            return None
+        # bpy.data.images is keyed by name not path, so keep our own path -> image lookup
+        image_key = os.path.normcase(os.path.abspath(texture_path))
+        img = self._image_cache.get(image_key)
         
-        texture_path = os.path.join(library['path'], diffuse_map)
+        if img is None:
+            if not os.path.exists(texture_path):
+                return None
+            
+            img = bpy.data.images.load(texture_path, check_existing=True)
+            self._image_cache[image_key] = img
         
-        if not os.path.exists(texture_path):
-            return None
+        # copying a ready made node tree is cheaper than building one for every texture
+        if self._material_template is None:
+            self._material_template = self.create_material_template()
         
-        img = None
-        if texture_path in bpy.data.images:
-            img = bpy.data.images[texture_path]
-        else:
-            img = bpy.data.images.load(texture_path)
+        mat = self._material_template.copy()
+        mat.name = f"{texture_name}_material"
+        mat.node_tree.nodes[TEXTURE_NODE_NAME].image = img
         
-        mat_name = f"{texture_name}_material"
-        mat = bpy.data.materials.new(name=mat_name)
+        return mat
+    
+    def create_material_template(self):
+        mat = bpy.data.materials.new(name="__xml_import_material_template")
         mat.use_nodes = True
         
         nodes = mat.node_tree.nodes
@@ -479,7 +767,7 @@ class IMPORT_OT_xml_map(Operator, ImportHelper):
             bsdf = nodes.new('ShaderNodeBsdfPrincipled')
         
         tex_node = nodes.new('ShaderNodeTexImage')
-        tex_node.image = img
+        tex_node.name = TEXTURE_NODE_NAME
         
         links.new(tex_node.outputs['Color'], bsdf.inputs['Base Color'])
         
@@ -526,6 +814,9 @@ class VIEW3D_PT_xml_map_libraries(Panel):
         row = layout.row()
         row.prop(prefs, "batch_size")
         
+        row = layout.row()
+        row.prop(prefs, "threads")
+        
         row = layout.row()
         row.operator("xml_map.refresh_libraries", text="Refresh Libraries")
 
@@ -542,6 +833,9 @@ class XML_MAP_OT_refresh_libraries(Operator):
             self.report({'ERROR'}, f"Prop libraries directory not found: {prop_libs_dir}")
             return {'CANCELLED'}
         
+        # next import reads every library.xml again
+        _library_cache.clear()
+        
         self.report({'INFO'}, f"Prop libraries refreshed from: {prop_libs_dir}")
         return {'FINISHED'}
 
@@ -613,6 +907,14 @@ class EXPORT_OT_xml_map(Operator, ExportHelper):
     )
 
     def execute(self, context):
+        # constant for the whole run, no need to rebuild them per object
+        self._scale = float(self.scale_factor)
+        self._z_up_axis = self.axis_up == 'Z'
+        if not self._z_up_axis:
+            self._conv = mathutils.Matrix.Rotation(math.pi/2.0, 4, 'X')
+            self._conv_inv = self._conv.inverted()
+        self._rotation_scale = 180.0 / math.pi if self.rotation_mode == 'DEGREES' else 1.0
+        
         start_time = time.time()
         result = self.export_xml_map(context)
         end_time = time.time()
@@ -641,30 +943,62 @@ class EXPORT_OT_xml_map(Operator, ExportHelper):
         box.label(text="Rotation Settings")
         box.prop(self, "rotation_mode")
     
+    def gather_transforms(self, source_objects, is_mesh, objects_to_export):
+        # read every location/rotation in one foreach_get when we have a real collection to read from
+        if source_objects is not None:
+            total = len(source_objects)
+            locations = np.empty(total * 3, dtype=np.float32)
+            rotations = np.empty(total * 3, dtype=np.float32)
+            source_objects.foreach_get('location', locations)
+            source_objects.foreach_get('rotation_euler', rotations)
+            # foreach_get wants float32, but scaling in float32 would round a second time
+            locations = locations.reshape(-1, 3)[is_mesh].astype(np.float64)
+            rotations = rotations.reshape(-1, 3)[is_mesh].astype(np.float64)
+        else:
+            locations = np.array([obj.location[:] for obj in objects_to_export], dtype=np.float64).reshape(-1, 3)
+            rotations = np.array([obj.rotation_euler[:] for obj in objects_to_export], dtype=np.float64).reshape(-1, 3)
+        
+        locations *= self._scale
+        
+        if not self._z_up_axis:
+            locations = locations[:, [0, 2, 1]]
+        
+        return locations, rotations
+    
     def export_xml_map(self, context):
         def clean_blender_suffix(name):
-            return re.sub(r'\.\d+$', '', name) if name else ""
-        
-        root = ET.Element('map')
-        root.set('version', '1.0.Light')
+            return BLENDER_SUFFIX_RE.sub('', name) if name else ""
         
-        static_geometry = ET.SubElement(root, 'static-geometry')
+        def escape_attr(value):
+            return escape(value, {'"': '&quot;'})
         
         objects_to_export = []
+        source_objects = None
+        is_mesh = None
         
         if self.export_selected:
             objects_to_export = [obj for obj in context.selected_objects if obj.type == 'MESH']
         elif self.export_collection:
             if self.export_collection in bpy.data.collections:
-                objects_to_export = [obj for obj in bpy.data.collections[self.export_collection].objects if obj.type == 'MESH']
+                source_objects = bpy.data.collections[self.export_collection].objects
         else:
-            objects_to_export = [obj for obj in bpy.data.objects if obj.type == 'MESH']
+            source_objects = bpy.data.objects
+        
+        if source_objects is not None:
+            is_mesh = np.array([obj.type == 'MESH' for obj in source_objects], dtype=bool)
+            objects_to_export = [obj for obj, mesh in zip(source_objects, is_mesh) if mesh]
+        
+        locations, rotations = self.gather_transforms(source_objects, is_mesh, objects_to_export)
         
         successful_count = 0
         skipped_count = 0
         missing_props = []
         
-        for obj in objects_to_export:
+        # written straight out as text, building an ElementTree per field is way slower on big maps
+        prop_lines = []
+        write = prop_lines.append
+        
+        for i, obj in enumerate(objects_to_export):
             if "xml_library_name" in obj and "xml_group_name" in obj and "xml_prop_name" in obj:
                 library_name = obj["xml_library_name"]
                 group_name = obj["xml_group_name"]
@@ -693,25 +1027,17 @@ class EXPORT_OT_xml_map(Operator, ExportHelper):
                         missing_props.append(obj.name)
                         continue
             
-            prop_elem = ET.SubElement(static_geometry, 'prop')
-            prop_elem.set('library-name', library_name)
-            prop_elem.set('group-name', group_name)
-            prop_elem.set('name', prop_name)
-            
-            rotation_elem = ET.SubElement(prop_elem, 'rotation')
-            
-            if self.axis_up == 'Z':
-                rot_z = obj.rotation_euler.z
+            if self._z_up_axis:
+                rot_z = float(rotations[i, 2])
+            elif not rotations[i].any():
+                # lots of props are never rotated, no need for the matrix round trip
+                rot_z = 0.0
             else:
-                conversion_matrix = mathutils.Matrix.Rotation(math.pi/2.0, 4, 'X')
                 rotation_matrix = obj.rotation_euler.to_matrix().to_4x4()
-                final_rotation = conversion_matrix.inverted() @ rotation_matrix @ conversion_matrix
+                final_rotation = self._conv_inv @ rotation_matrix @ self._conv
                 rot_z = final_rotation.to_euler().z
             
-            if self.rotation_mode == 'DEGREES':
-                rot_z = math.degrees(rot_z)
-            
-            ET.SubElement(rotation_elem, 'z').text = f"{rot_z:.6f}"
+            rot_z *= self._rotation_scale
             
             texture_name = ""
             should_have_texture_value = False
@@ -722,8 +1048,8 @@ class EXPORT_OT_xml_map(Operator, ExportHelper):
                 if should_have_texture_value and "xml_texture_name" in obj:
                     texture_name = obj["xml_texture_name"]
                     texture_name = clean_blender_suffix(texture_name)
-            elif obj.data.materials and obj.data.materials[0]:
-                material = obj.data.materials[0]
+            elif obj.material_slots and obj.material_slots[0].material:
+                material = obj.material_slots[0].material
                 
                 material_name = material.name
                 if "_material" in material_name:
@@ -732,35 +1058,40 @@ class EXPORT_OT_xml_map(Operator, ExportHelper):
                 else:
                     should_have_texture_value = False
             
-            texture_elem = ET.SubElement(prop_elem, 'texture-name')
-            if should_have_texture_value and texture_name:
-                texture_elem.text = texture_name
-            
-            position_elem = ET.SubElement(prop_elem, 'position')
+            x, y, z = locations[i]
             
-            scaled_position = [p * self.scale_factor for p in obj.location]
+            write(f'    <prop library-name="{escape_attr(library_name)}" group-name="{escape_attr(group_name)}" name="{escape_attr(prop_name)}">\n'
+                  f'      <rotation>\n'
+                  f'        <z>{rot_z:.6f}</z>\n'
+                  f'      </rotation>\n')
             
-            if self.axis_up == 'Z':
-                x, y, z = scaled_position
+            if should_have_texture_value and texture_name:
+                write(f'      <texture-name>{escape(texture_name)}</texture-name>\n')
             else:
-                x, z, y = scaled_position
+                write('      <texture-name/>\n')
             
-            ET.SubElement(position_elem, 'x').text = f"{x:.3f}"
-            ET.SubElement(position_elem, 'y').text = f"{y:.3f}"
-            ET.SubElement(position_elem, 'z').text = f"{z:.3f}"
+            write(f'      <position>\n'
+                  f'        <x>{x:.3f}</x>\n'
+                  f'        <y>{y:.3f}</y>\n'
+                  f'        <z>{z:.3f}</z>\n'
+                  f'      </position>\n'
+                  f'    </prop>\n')
             
             successful_count += 1
         
-        tree = ET.ElementTree(root)
-        
-        ET.indent(tree, space="  ")
-        
         try:
             xml_header = '<?xml version="1.0" encoding="UTF-8"?>\n'
-            xml_content = ET.tostring(root, encoding='utf-8').decode('utf-8')
             
-            xml_content = xml_content.replace('<texture-name></texture-name>', '<texture-name/>')
-            xml_content = xml_content.replace('<texture-name />', '<texture-name/>')
+            if prop_lines:
+                xml_content = ('<map version="1.0.Light">\n'
+                               '  <static-geometry>\n'
+                               + ''.join(prop_lines) +
+                               '  </static-geometry>\n'
+                               '</map>\n')
+            else:
+                xml_content = ('<map version="1.0.Light">\n'
+                               '  <static-geometry/>\n'
+                               '</map>\n')
             
             with open(self.filepath, 'w', encoding='utf-8') as f:
                 f.write(xml_header + xml_content)